@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""
+脚本模块加载 (Script Loader)
+网关与浸泡测试共用：按文件路径加载同目录下的服务器/客户端脚本
+"""
+
+import os
+import importlib.util
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_script(name, filename):
+    """按文件路径加载脚本模块（文件名含连字符，无法直接 import）"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(BASE_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -7,12 +7,15 @@
 
 import sys
 import os
+import json
+import signal
 import asyncio
 import logging
-from dotenv import load_dotenv
+from dotenv import load_dotenv, dotenv_values
 from asyncua import Client
 from asyncua.crypto.security_policies import SecurityPolicyBasic256Sha256
 from asyncua.ua import MessageSecurityMode
+from profiling import RuntimeProfiler, timed
 
 # ============================================================================
 # 配置加载
@@ -21,8 +24,14 @@ class Config:
     """客户端配置"""
     
     def __init__(self):
+        self.dotenv_file = os.getenv('DOTENV_FILE', '.env')
+        self._process_keys = set(os.environ)  # 进程环境变量优先于配置文件
+        self._file_keys = set()
         self._load_env()
-        
+        self._read()
+    
+    def _read(self):
+        """从环境变量读取配置项"""
         # 连接配置
         self.endpoint = os.getenv('OPC_ENDPOINT', 'opc.tcp://localhost:4840')
         self.username = os.getenv('OPC_USERNAME', 'monitor')
@@ -36,18 +45,67 @@ class Config:
         self.mode = os.getenv('MONITOR_MODE', 'poll')  # poll 或 subscription
         self.log_level = os.getenv('LOG_LEVEL', 'INFO')
         
+        # 轮询调度配置（分组速率 + 空闲降频）
+        self.poll_fast_interval = float(os.getenv('POLL_FAST_INTERVAL', '0.5'))
+        self.poll_slow_interval = float(os.getenv('POLL_SLOW_INTERVAL', '10'))
+        self.poll_fast_nodes = self._get_list('POLL_FAST_NODES', 'StageVibration')
+        self.poll_slow_nodes = self._get_list('POLL_SLOW_NODES', 'Temperature')
+        self.poll_idle_factor = float(os.getenv('POLL_IDLE_FACTOR', '5'))
+        
         # 命名空间配置
         self.namespace = os.getenv('OPC_NAMESPACE', '2')
         self.node_id_type = os.getenv('DEFAULT_NODE_ID_TYPE', 'i')
+        
+        # 节点映射热加载
+        self.node_map_file = os.getenv('NODE_MAP_FILE', '')
+        self.reload_interval = float(os.getenv('NODE_RELOAD_INTERVAL', '5'))
     
     def _load_env(self):
         """加载环境变量配置文件"""
-        dotenv_file = os.getenv('DOTENV_FILE', '.env')
-        if os.path.exists(dotenv_file):
-            load_dotenv(dotenv_file)
-            print(f"📁 已加载配置文件: {dotenv_file}")
+        if os.path.exists(self.dotenv_file):
+            load_dotenv(self.dotenv_file)
+            self._file_keys = set(dotenv_values(self.dotenv_file)) - self._process_keys
+            print(f"📁 已加载配置文件: {self.dotenv_file}")
         else:
-            print(f"⚠️  配置文件不存在: {dotenv_file}，使用默认配置")
+            print(f"⚠️  配置文件不存在: {self.dotenv_file}，使用默认配置")
+    
+    def reload(self):
+        """重新读取配置文件（进程环境变量中显式设置的项保持不变）"""
+        values = dotenv_values(self.dotenv_file) if os.path.exists(self.dotenv_file) else {}
+        keys = set(values) - self._process_keys
+        
+        for key in self._file_keys - keys:
+            os.environ.pop(key, None)
+        for key in keys:
+            if values[key] is not None:
+                os.environ[key] = values[key]
+        
+        self._file_keys = keys
+        self._read()
+    
+    def snapshot(self):
+        """保存当前环境变量与配置项，重新加载失败时用 restore 恢复"""
+        return dict(os.environ), dict(vars(self))
+    
+    def restore(self, state):
+        """恢复 snapshot 保存的配置"""
+        environ, attrs = state
+        for key in set(os.environ) - set(environ):
+            del os.environ[key]
+        os.environ.update(environ)
+        vars(self).clear()
+        vars(self).update(attrs)
+    
+    @property
+    def watched_files(self):
+        """热加载监视的文件"""
+        return [f for f in (self.dotenv_file, self.node_map_file) if f]
+    
+    @staticmethod
+    def _get_list(key, default=''):
+        """读取逗号分隔的列表配置"""
+        value = os.getenv(key, default)
+        return [item.strip() for item in value.split(',') if item.strip()]
     
     def get_node_id(self, node_key, default_value, default_type=None):
         """获取节点ID配置"""
@@ -85,35 +143,66 @@ logging.getLogger("asyncua").setLevel(logging.WARNING)
 # ============================================================================
 # 节点定义
 # ============================================================================
-NODES = {
-    # 身份信息
-    'VendorID': config.get_node_id('VENDOR_ID', '3', 'i'),
-    'SerialNumber': config.get_node_id('SERIAL_NUMBER', '4', 'i'),
-    'ModelName': config.get_node_id('MODEL_NAME', '5', 'i'),
-    
-    # 运行状态
-    'MachineStatus': config.get_node_id('MACHINE_STATUS', '7', 'i'),
-    'IsSelected': config.get_node_id('IS_SELECTED', '8', 'i'),
-    
-    # 工艺数据
-    'WaferCount': config.get_node_id('WAFER_COUNT', '10', 'i'),
-    'ExposureEnergy': config.get_node_id('EXPOSURE_ENERGY', '11', 'i'),
-    'DoseError': config.get_node_id('DOSE_ERROR', '12', 'i'),
-    'OverlayPrecision': config.get_node_id('OVERLAY_PRECISION', '13', 'i'),
-    
-    # 健康状态
-    'LaserPulseCount': config.get_node_id('LASER_PULSE_COUNT', '15', 'i'),
-    'StageVibration': config.get_node_id('STAGE_VIBRATION', '16', 'i'),
-    'Temperature': config.get_node_id('TEMPERATURE', '17', 'i'),
-    'AlarmMessage': config.get_node_id('ALARM_MESSAGE', '18', 'i'),
-}
+IDENTIFICATION_NODES = ['VendorID', 'SerialNumber', 'ModelName']
 
-# 动态监控的节点列表
-DYNAMIC_NODES = [
+# 默认动态监控的节点列表
+DEFAULT_DYNAMIC_NODES = [
     'MachineStatus', 'WaferCount', 'DoseError',
     'OverlayPrecision', 'StageVibration', 'Temperature', 'AlarmMessage'
 ]
 
+
+def build_node_map():
+    """根据当前配置生成节点映射和动态节点列表
+    
+    NODE_MAP_FILE 可指定 JSON 节点映射文件，用于追加或覆盖节点::
+        
+        {"nodes": {"NewParameter": "ns=2;i=19"}, "dynamic": ["MachineStatus", "NewParameter"]}
+    
+    省略 dynamic 时，在默认动态节点后追加文件中新增的节点。
+    """
+    nodes = {
+        # 身份信息
+        'VendorID': config.get_node_id('VENDOR_ID', '3', 'i'),
+        'SerialNumber': config.get_node_id('SERIAL_NUMBER', '4', 'i'),
+        'ModelName': config.get_node_id('MODEL_NAME', '5', 'i'),
+        
+        # 运行状态
+        'MachineStatus': config.get_node_id('MACHINE_STATUS', '7', 'i'),
+        'IsSelected': config.get_node_id('IS_SELECTED', '8', 'i'),
+        
+        # 工艺数据
+        'WaferCount': config.get_node_id('WAFER_COUNT', '10', 'i'),
+        'ExposureEnergy': config.get_node_id('EXPOSURE_ENERGY', '11', 'i'),
+        'DoseError': config.get_node_id('DOSE_ERROR', '12', 'i'),
+        'OverlayPrecision': config.get_node_id('OVERLAY_PRECISION', '13', 'i'),
+        
+        # 健康状态
+        'LaserPulseCount': config.get_node_id('LASER_PULSE_COUNT', '15', 'i'),
+        'StageVibration': config.get_node_id('STAGE_VIBRATION', '16', 'i'),
+        'Temperature': config.get_node_id('TEMPERATURE', '17', 'i'),
+        'AlarmMessage': config.get_node_id('ALARM_MESSAGE', '18', 'i'),
+    }
+    dynamic = list(DEFAULT_DYNAMIC_NODES)
+    
+    if config.node_map_file:
+        with open(config.node_map_file, encoding='utf-8') as f:
+            node_map = json.load(f)
+        extra = node_map.get('nodes', {})
+        added = [name for name in extra if name not in nodes and name not in IDENTIFICATION_NODES]
+        nodes.update(extra)
+        dynamic = node_map.get('dynamic', dynamic + added)
+    
+    if not dynamic:
+        raise ValueError("动态节点列表不能为空")
+    missing = [name for name in dynamic if name not in nodes]
+    if missing:
+        raise ValueError(f"动态节点未配置 NodeID: {', '.join(missing)}")
+    return nodes, dynamic
+
+
+NODES, DYNAMIC_NODES = build_node_map()
+
 # ============================================================================
 # 数据格式化
 # ============================================================================
@@ -127,6 +216,11 @@ class DataFormatter:
         3: 'Execute',
     }
     
+    KNOWN_NODES = {
+        'MachineStatus', 'WaferCount', 'DoseError', 'OverlayPrecision',
+        'StageVibration', 'Temperature', 'AlarmMessage',
+    }
+    
     def __init__(self):
         self.last_alarm = ""
     
@@ -161,6 +255,10 @@ class DataFormatter:
         
         if 'AlarmMessage' in data:
             self._handle_alarm(data['AlarmMessage'])
+        
+        # 热加载新增的节点
+        for name in data.keys() - self.KNOWN_NODES:
+            logger.info(f"📈 [数据] {name}: {data[name]}")
     
     def _handle_alarm(self, alarm):
         """处理报警信息"""
@@ -181,22 +279,128 @@ class SubscriptionHandler:
     
     def __init__(self):
         self.data = {}
+        self.names = {}  # NodeID -> 节点名称
+    
+    def track(self, name, node):
+        """登记订阅节点"""
+        self.names[node.nodeid.to_string()] = name
+    
+    def forget(self, names):
+        """移除已取消订阅的节点"""
+        names = set(names)
+        self.names = {nid: n for nid, n in self.names.items() if n not in names}
+        for name in names:
+            self.data.pop(name, None)
     
+    @timed()
     def datachange_notification(self, node, val, data):
         """数据变化回调"""
-        node_id = node.nodeid.to_string()
-        
-        # 查找节点名称
-        for name, nid in NODES.items():
-            if nid == node_id:
-                self.data[name] = val
-                break
+        name = self.names.get(node.nodeid.to_string())
+        if name is not None:
+            self.data[name] = val
     
     def get_and_clear(self):
         """获取数据并清空缓存"""
-        data = self.data.copy()
+        data, self.data = self.data, {}
         return data
 
+# ============================================================================
+# 轮询调度器
+# ============================================================================
+class PollGroup:
+    """轮询分组：同组节点以相同速率批量读取"""
+    
+    def __init__(self, name, interval, names, idle_slowdown=True):
+        self.name = name
+        self.interval = interval
+        self.names = names
+        self.idle_slowdown = idle_slowdown
+        self.next_due = 0.0
+    
+    def effective_interval(self, idle_factor):
+        """当前生效的轮询间隔"""
+        return self.interval * idle_factor if self.idle_slowdown else self.interval
+
+
+class PollingScheduler:
+    """按分组速率调度读取，机器空闲/离线时自动降频"""
+    
+    IDLE_STATES = (0, 2)  # Offline, Idle
+    
+    def __init__(self, dynamic_nodes):
+        self.groups = self._build_groups(dynamic_nodes)
+        self.idle = False
+    
+    @staticmethod
+    def _build_groups(dynamic_nodes):
+        """根据配置将动态节点划分为 state / fast / normal / slow 分组"""
+        state = [n for n in dynamic_nodes if n == 'MachineStatus']
+        rest = [n for n in dynamic_nodes if n not in state]
+        fast = [n for n in rest if n in config.poll_fast_nodes]
+        slow = [n for n in rest if n in config.poll_slow_nodes and n not in fast]
+        normal = [n for n in rest if n not in fast and n not in slow]
+        
+        groups = [
+            # 状态分组不降频，保证状态切换能及时感知
+            PollGroup('state', config.interval, state, idle_slowdown=False),
+            PollGroup('fast', config.poll_fast_interval, fast),
+            PollGroup('normal', config.interval, normal),
+            PollGroup('slow', config.poll_slow_interval, slow),
+        ]
+        return [g for g in groups if g.names]
+    
+    @property
+    def idle_factor(self):
+        return config.poll_idle_factor if self.idle else 1.0
+    
+    def due_groups(self, now):
+        """返回当前到期的分组"""
+        return [g for g in self.groups if g.next_due <= now]
+    
+    def seconds_until_next(self, now):
+        """距离下一个分组到期的秒数（无分组时按基础间隔等待）"""
+        if not self.groups:
+            return config.interval
+        return max(0.0, min(g.next_due for g in self.groups) - now)
+    
+    def mark_polled(self, groups, now):
+        """更新已读取分组的下次到期时间"""
+        for group in groups:
+            group.next_due = now + group.effective_interval(self.idle_factor)
+    
+    def rebuild(self, dynamic_nodes):
+        """节点映射变化后重建分组，保留空闲状态"""
+        scheduler = PollingScheduler(dynamic_nodes)
+        scheduler.idle = self.idle
+        return scheduler
+    
+    def update_state(self, data):
+        """根据 MachineStatus 切换空闲降频"""
+        if 'MachineStatus' not in data:
+            return
+        idle = data['MachineStatus'] in self.IDLE_STATES
+        if idle == self.idle:
+            return
+        
+        self.idle = idle
+        if idle:
+            logger.info(f"⏬ [调度] 机器空闲/离线，降频 x{config.poll_idle_factor:g}")
+        else:
+            # 恢复运行时立即读取被降频的分组
+            for group in self.groups:
+                if group.idle_slowdown:
+                    group.next_due = 0.0
+            logger.info("⏫ [调度] 机器运行，恢复正常速率")
+    
+    def describe(self):
+        """打印分组配置"""
+        for group in self.groups:
+            slowdown = "" if group.idle_slowdown else "（不降频）"
+            logger.info(
+                f"   [{group.name}] {group.interval:g}秒{slowdown}: "
+                f"{', '.join(group.names)}"
+            )
+
 # ============================================================================
 # 监控客户端
 # ============================================================================
@@ -206,6 +410,15 @@ class LithoMonitorClient:
     def __init__(self):
         self.client = None
         self.formatter = DataFormatter()
+        
+        # 监控状态（热加载时增量更新）
+        self.scheduler = None
+        self.subscription = None
+        self.handler = None
+        self.handles = {}  # 节点名称 -> (监控项句柄, 订阅时的 NodeID)
+        self._reload_tasks = set()
+        self._reload_lock = asyncio.Lock()
+        self._subscription_dirty = False  # 热加载时订阅更新失败，待重试
     
     # ------------------------------------------------------------------------
     # 连接管理
@@ -231,6 +444,7 @@ class LithoMonitorClient:
     
     async def disconnect(self):
         """断开连接"""
+        self.stop_hot_reload()
         if self.client:
             try:
                 await self.client.disconnect()
@@ -294,12 +508,32 @@ class LithoMonitorClient:
         
         self._log_separator()
     
-    async def read_dynamic_data(self):
-        """读取动态数据"""
+    @timed()
+    async def read_dynamic_data(self, names=None):
+        """读取动态数据（单次批量读取）"""
+        if names is None:
+            names = DYNAMIC_NODES
+        names = [name for name in names if name in NODES]
+        nodes = [self.client.get_node(NODES[name]) for name in names]
+        try:
+            results = await self.client.read_attributes(nodes)
+        except Exception as e:
+            logger.debug(f"批量读取失败，逐个读取: {e}")
+            return await self._read_each(names, nodes)
+        
+        # 跳过状态码异常的节点（如 NodeID 不存在）
+        return {
+            name: result.Value.Value
+            for name, result in zip(names, results)
+            if result.StatusCode.is_good() and result.Value is not None
+        }
+    
+    @staticmethod
+    async def _read_each(names, nodes):
+        """逐个读取节点，跳过失败的节点"""
         data = {}
-        for name in DYNAMIC_NODES:
+        for name, node in zip(names, nodes):
             try:
-                node = self.client.get_node(NODES[name])
                 data[name] = await node.read_value()
             except:
                 pass
@@ -314,11 +548,25 @@ class LithoMonitorClient:
         logger.info("📡 开始轮询监控动态数据变化...")
         self._log_separator()
         
+        self.scheduler = PollingScheduler(DYNAMIC_NODES)
+        logger.info("⏱️  轮询分组:")
+        self.scheduler.describe()
+        self._log_separator()
+        
+        loop = asyncio.get_running_loop()
         try:
             while True:
-                data = await self.read_dynamic_data()
+                scheduler = self.scheduler
+                now = loop.time()
+                groups = scheduler.due_groups(now)
+                names = [name for g in groups for name in g.names]
+                
+                data = await self.read_dynamic_data(names) if names else {}
+                scheduler.update_state(data)
+                scheduler.mark_polled(groups, now)
                 self.formatter.print_data(data)
-                await asyncio.sleep(config.interval)
+                
+                await asyncio.sleep(self.scheduler.seconds_until_next(loop.time()))
         except KeyboardInterrupt:
             logger.info("\n🛑 数据接收器已停止")
     
@@ -328,19 +576,18 @@ class LithoMonitorClient:
         logger.info("📡 开始订阅监控动态数据变化...")
         self._log_separator()
         
-        handler = SubscriptionHandler()
+        self.handler = SubscriptionHandler()
         
         # 创建订阅
-        subscription = await self.client.create_subscription(
+        self.subscription = await self.client.create_subscription(
             period=config.interval * 1000,
-            handler=handler
+            handler=self.handler
         )
         logger.info(f"✅ 订阅已创建 (发布间隔: {config.interval}秒)")
         
         # 订阅节点
-        nodes = [self.client.get_node(NODES[name]) for name in DYNAMIC_NODES]
-        await subscription.subscribe_data_change(nodes)
-        logger.info(f"✅ 已订阅 {len(nodes)} 个数据节点")
+        await self._subscribe_nodes(DYNAMIC_NODES)
+        logger.info(f"✅ 已订阅 {len(self.handles)} 个数据节点")
         
         self._log_separator()
         logger.info("📡 等待数据变化推送... (按 Ctrl+C 停止)")
@@ -348,14 +595,139 @@ class LithoMonitorClient:
         try:
             while True:
                 await asyncio.sleep(config.interval)
-                data = handler.get_and_clear()
+                data = self.handler.get_and_clear()
                 self.formatter.print_data(data)
         except KeyboardInterrupt:
             logger.info("\n🛑 数据接收器已停止")
         finally:
-            await subscription.delete()
+            await self.subscription.delete()
+            self.subscription = None
+            self.handles = {}
             logger.info("✅ 订阅已清理")
     
+    async def _subscribe_nodes(self, names):
+        """向现有订阅添加监控项"""
+        if not names:
+            return
+        
+        nodes = [self.client.get_node(NODES[name]) for name in names]
+        for name, node in zip(names, nodes):
+            self.handler.track(name, node)
+        
+        handles = await self.subscription.subscribe_data_change(nodes)
+        for name, handle in zip(names, handles):
+            if isinstance(handle, int):
+                self.handles[name] = (handle, NODES[name])
+            else:
+                logger.warning(f"⚠️  订阅节点失败: {name} ({handle})")
+    
+    async def _unsubscribe_nodes(self, names):
+        """从现有订阅移除监控项（服务器确认后才移除句柄）"""
+        names = [name for name in names if name in self.handles]
+        if names:
+            await self.subscription.unsubscribe([self.handles[name][0] for name in names])
+        for name in names:
+            del self.handles[name]
+        self.handler.forget(names)
+    
+    async def _sync_subscription(self):
+        """按实际已订阅的监控项与当前节点映射对齐订阅"""
+        wanted = {name: NODES[name] for name in DYNAMIC_NODES}
+        removed = [name for name, (_, nodeid) in self.handles.items() if wanted.get(name) != nodeid]
+        await self._unsubscribe_nodes(removed)
+        added = [name for name in wanted if name not in self.handles]
+        await self._subscribe_nodes(added)
+    
+    # ------------------------------------------------------------------------
+    # 节点映射热加载
+    # ------------------------------------------------------------------------
+    def start_hot_reload(self):
+        """启用 SIGHUP 与配置文件变化触发的节点映射热加载"""
+        loop = asyncio.get_running_loop()
+        if hasattr(signal, 'SIGHUP'):
+            loop.add_signal_handler(signal.SIGHUP, self._spawn_reload)
+        
+        if config.reload_interval > 0:
+            self._track(asyncio.create_task(self._watch_node_config()))
+        logger.info(f"🔁 节点映射热加载: 监视 {', '.join(config.watched_files)}")
+    
+    def stop_hot_reload(self):
+        """停止热加载"""
+        for task in list(self._reload_tasks):
+            task.cancel()
+    
+    def _spawn_reload(self):
+        self._track(asyncio.create_task(self.reload_nodes()))
+    
+    def _track(self, task):
+        self._reload_tasks.add(task)
+        task.add_done_callback(self._reload_tasks.discard)
+    
+    async def _watch_node_config(self):
+        """定期检查配置文件修改时间"""
+        mtimes = self._file_mtimes()
+        while True:
+            await asyncio.sleep(config.reload_interval)
+            current = self._file_mtimes()
+            if current != mtimes or self._subscription_dirty:
+                mtimes = current
+                await self.reload_nodes()
+    
+    @staticmethod
+    def _file_mtimes():
+        return {
+            path: os.stat(path).st_mtime_ns if os.path.exists(path) else None
+            for path in config.watched_files
+        }
+    
+    async def reload_nodes(self):
+        """重新加载节点映射，只增删发生变化的监控项
+        
+        SIGHUP 与文件监视可能同时触发，加锁串行执行。配置或节点映射无效时
+        恢复原配置；订阅更新失败时记录错误，由文件监视在下个周期重试。
+        """
+        async with self._reload_lock:
+            old = {name: NODES[name] for name in DYNAMIC_NODES}
+            state = config.snapshot()
+            try:
+                config.reload()
+                nodes, dynamic = build_node_map()
+            except Exception as e:
+                config.restore(state)
+                logger.error(f"❌ 节点映射重新加载失败，保持当前配置: {e}")
+                return
+            
+            new = {name: nodes[name] for name in dynamic}
+            removed = [name for name in old if new.get(name) != old[name]]
+            added = [name for name in new if old.get(name) != new[name]]
+            
+            NODES.clear()
+            NODES.update(nodes)
+            DYNAMIC_NODES[:] = dynamic
+            
+            if self.scheduler:
+                self.scheduler = self.scheduler.rebuild(DYNAMIC_NODES)
+            retry, self._subscription_dirty = self._subscription_dirty, False
+            if self.subscription:
+                try:
+                    await self._sync_subscription()
+                except Exception as e:
+                    self._subscription_dirty = True
+                    logger.error(f"❌ 订阅更新失败，稍后重试: {e}")
+                    return
+            
+            if retry and not (removed or added):
+                logger.info("🔁 订阅已与节点映射重新同步")
+            else:
+                self._log_reload(removed, added)
+    
+    @staticmethod
+    def _log_reload(removed, added):
+        if removed or added:
+            logger.info(f"🔁 节点映射已更新: 新增 {added or '无'}, 移除 {removed or '无'}")
+        else:
+            logger.info("🔁 节点映射无变化")
+    
     # ------------------------------------------------------------------------
     # 辅助方法
     # ------------------------------------------------------------------------
@@ -374,10 +746,13 @@ class LithoMonitorClient:
 # ============================================================================
 async def main():
     client = LithoMonitorClient()
+    profiler = RuntimeProfiler("client")
     
     try:
+        profiler.install()
         await client.connect()
         await client.read_identification()
+        client.start_hot_reload()
         
         if config.mode == 'subscription':
             await client.monitor_subscription()
@@ -391,6 +766,7 @@ async def main():
         sys.exit(1)
     
     finally:
+        profiler.shutdown()
         await client.disconnect()
 
 if __name__ == "__main__":
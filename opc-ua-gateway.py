@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+光刻机数据聚合网关 (OPC UA Gateway)
+上游：对光刻机只保持一个加密会话 + 一个订阅
+下游：本地 OPC UA 服务器（可选 WebSocket）从缓存向任意数量的消费者提供数据
+"""
+
+import os
+import sys
+import json
+import asyncio
+import logging
+from asyncua import ua
+from profiling import RuntimeProfiler, timed
+from _scripts import load_script
+
+# ============================================================================
+# 复用客户端与服务器实现
+# ============================================================================
+# 先加载客户端：其 Config 负责读取 .env 配置
+litho_client = load_script("litho_client", "opc-ua-client.py")
+litho_server = load_script("litho_server", "opc-ua-server.py")
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+logging.getLogger("websockets").setLevel(logging.WARNING)
+
+logger = litho_client.logger
+config = litho_client.config
+NODES = litho_client.NODES
+
+# ============================================================================
+# 网关配置
+# ============================================================================
+class GatewayConfig:
+    """网关配置"""
+    
+    def __init__(self):
+        # 下游 OPC UA 端点
+        self.endpoint = os.getenv('GATEWAY_ENDPOINT', 'opc.tcp://0.0.0.0:4841/litho-monitor/gateway/')
+        self.name = os.getenv('GATEWAY_NAME', 'Lithography Machine Gateway')
+        
+        # 下游 WebSocket 推送（为空则不启用）
+        self.ws_host = os.getenv('GATEWAY_WS_HOST', '0.0.0.0')
+        self.ws_port = int(os.getenv('GATEWAY_WS_PORT', '0') or 0)
+        
+        # 上游健康检查与重连
+        self.health_interval = float(os.getenv('GATEWAY_HEALTH_INTERVAL', '5'))
+        self.reconnect_delay = float(os.getenv('GATEWAY_RECONNECT_DELAY', '5'))
+
+
+gateway_config = GatewayConfig()
+
+# ============================================================================
+# 上游订阅处理器
+# ============================================================================
+class MirrorHandler:
+    """将上游数据变化写入本地镜像节点并广播"""
+    
+    def __init__(self, gateway):
+        self.gateway = gateway
+        self.names = {}  # 上游 NodeId -> 节点名称
+    
+    @timed()
+    async def datachange_notification(self, node, val, data):
+        """数据变化回调"""
+        name = self.names.get(node.nodeid)
+        if name is None:
+            return
+        await self.gateway.publish(name, data.monitored_item.Value)
+    
+    async def status_change_notification(self, status):
+        """上游订阅状态变化（会话超时、服务器关闭等）"""
+        if status.Status.is_good():
+            return
+        logger.warning(f"⚠️  上游订阅状态异常: {status.Status}")
+        await self.gateway.mark_stale()
+
+# ============================================================================
+# WebSocket 推送
+# ============================================================================
+class WebSocketFeed:
+    """WebSocket 数据推送（连接时发送快照，之后推送增量）"""
+    
+    def __init__(self, cache):
+        self.cache = cache
+        self.clients = set()
+        self.server = None
+    
+    async def start(self):
+        """启动 WebSocket 服务"""
+        self.server = await websockets.serve(
+            self._handle, gateway_config.ws_host, gateway_config.ws_port
+        )
+        logger.info(f"🌐 WebSocket 推送: ws://{gateway_config.ws_host}:{gateway_config.ws_port}")
+    
+    async def stop(self):
+        """停止 WebSocket 服务"""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+    
+    async def _handle(self, websocket):
+        """处理单个下游连接"""
+        self.clients.add(websocket)
+        try:
+            await websocket.send(self._encode(self.cache))
+            await websocket.wait_closed()
+        finally:
+            self.clients.discard(websocket)
+    
+    def broadcast(self, name, value):
+        """向所有下游连接推送变化"""
+        if self.clients:
+            websockets.broadcast(self.clients, self._encode({name: value}))
+    
+    @staticmethod
+    def _encode(values):
+        return json.dumps(values, ensure_ascii=False, default=str)
+
+# ============================================================================
+# 聚合网关
+# ============================================================================
+class LithoGateway:
+    """光刻机聚合网关"""
+    
+    def __init__(self):
+        self.upstream = litho_client.LithoMonitorClient()
+        # 镜像只包含内置节点：模型扩展变量不在客户端节点映射中，无法订阅更新
+        self.mirror = litho_server.LithoMachineServer(
+            endpoint=gateway_config.endpoint, name=gateway_config.name, model_path=''
+        )
+        self.cache = {}
+        self.feed = None
+        self.subscription = None
+        self.upstream_ids = {}  # 镜像节点名称 -> 上游 NodeID
+        self.stale = False
+    
+    # ------------------------------------------------------------------------
+    # 初始化
+    # ------------------------------------------------------------------------
+    async def init(self):
+        """初始化本地镜像服务器和 WebSocket 推送"""
+        await self.mirror.init()
+        
+        # 镜像节点按名称对应客户端节点映射，映射中没有的按本地 NodeID 访问上游
+        self.upstream_ids = {
+            name: NODES.get(name, node.nodeid.to_string())
+            for name, node in self.mirror.nodes.items()
+        }
+        
+        # 首次同步前镜像中只有模拟器初始值
+        await self.mark_stale()
+        
+        if gateway_config.ws_port:
+            if websockets is None:
+                logger.warning("⚠️  未安装 websockets，WebSocket 推送已禁用")
+            else:
+                self.feed = WebSocketFeed(self.cache)
+    
+    # ------------------------------------------------------------------------
+    # 数据镜像
+    # ------------------------------------------------------------------------
+    async def publish(self, name, datavalue):
+        """更新缓存、镜像节点和 WebSocket 下游"""
+        node = self.mirror.nodes.get(name)
+        if node is None:
+            return
+        
+        await node.write_value(datavalue)
+        self.stale = False
+        value = datavalue.Value.Value if datavalue.Value is not None else None
+        self.cache[name] = value
+        if self.feed:
+            self.feed.broadcast(name, value)
+    
+    async def mark_stale(self):
+        """上游断开期间将镜像节点标记为 BadNoCommunication（保留最后值）"""
+        if self.stale:
+            return
+        self.stale = True
+        
+        status = ua.StatusCode(ua.StatusCodes.BadNoCommunication)
+        for node in self.mirror.nodes.values():
+            last = await node.read_data_value(raise_on_bad_status=False)
+            await self.mirror.server.write_attribute_value(
+                node.nodeid, ua.DataValue(Value=last.Value, StatusCode=status)
+            )
+        logger.warning(f"⚠️  上游不可用，{len(self.mirror.nodes)} 个镜像节点已标记为 BadNoCommunication")
+    
+    async def _sync_snapshot(self):
+        """连接后全量同步一次，覆盖镜像节点的初始值"""
+        names = list(self.upstream_ids)
+        nodes = [self.upstream.client.get_node(self.upstream_ids[name]) for name in names]
+        values = await self.upstream.client.read_attributes(nodes)
+        
+        for name, datavalue in zip(names, values):
+            if datavalue.StatusCode.is_good():
+                await self.publish(name, datavalue)
+        logger.info(f"✅ 已同步 {len(names)} 个节点快照")
+    
+    async def _subscribe(self):
+        """对上游创建唯一的订阅"""
+        handler = MirrorHandler(self)
+        self.subscription = await self.upstream.client.create_subscription(
+            period=config.interval * 1000,
+            handler=handler
+        )
+        
+        # 订阅全部镜像变量，仅跳过静态的身份信息
+        nodes = []
+        for name, nodeid in self.upstream_ids.items():
+            if name in litho_client.IDENTIFICATION_NODES:
+                continue
+            node = self.upstream.client.get_node(nodeid)
+            handler.names[node.nodeid] = name
+            nodes.append(node)
+        
+        await self.subscription.subscribe_data_change(nodes)
+        logger.info(f"✅ 上游订阅已创建: {len(nodes)} 个数据节点")
+    
+    # ------------------------------------------------------------------------
+    # 运行
+    # ------------------------------------------------------------------------
+    async def start(self):
+        """启动网关"""
+        async with self.mirror.server:
+            if self.feed:
+                await self.feed.start()
+            self._log_startup_info()
+            try:
+                await self._run_upstream()
+            finally:
+                if self.feed:
+                    await self.feed.stop()
+    
+    async def _run_upstream(self):
+        """保持上游会话，断线后自动重连"""
+        while True:
+            try:
+                await self.upstream.connect()
+                await self._sync_snapshot()
+                await self._subscribe()
+                await self._watch_upstream()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ 上游连接异常: {e}")
+            finally:
+                await self._close_upstream()
+            
+            logger.info(f"🔁 {gateway_config.reconnect_delay:g}秒后重连上游...")
+            await asyncio.sleep(gateway_config.reconnect_delay)
+    
+    async def _watch_upstream(self):
+        """定期检查上游会话是否存活"""
+        state_node = self.upstream.client.get_node(ua.ObjectIds.Server_ServerStatus_State)
+        while True:
+            await asyncio.sleep(gateway_config.health_interval)
+            await state_node.read_value()
+    
+    async def _close_upstream(self):
+        """清理上游订阅和会话"""
+        if self.subscription:
+            try:
+                await self.subscription.delete()
+            except Exception:
+                pass
+            self.subscription = None
+        await self.upstream.disconnect()
+        await self.mark_stale()
+    
+    def _log_startup_info(self):
+        """打印启动信息"""
+        self.mirror._log_header("光刻机数据网关启动成功")
+        logger.info(f"📡 上游设备: {config.endpoint}")
+        logger.info(f"📡 下游端点: {gateway_config.endpoint}")
+        logger.info(f"📊 镜像节点: {len(self.mirror.nodes)}个")
+        self.mirror._log_separator()
+
+# ============================================================================
+# 主入口
+# ============================================================================
+async def main():
+    gateway = LithoGateway()
+    profiler = RuntimeProfiler("gateway")
+    
+    try:
+        profiler.install()
+        await gateway.init()
+        await gateway.start()
+    except FileNotFoundError:
+        logger.error("❌ 证书文件未找到")
+        logger.error("💡 请先运行: ./gen-certs-openssl.sh")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"❌ 网关启动失败: {e}")
+        sys.exit(1)
+    finally:
+        profiler.shutdown()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("\n🛑 网关已停止")
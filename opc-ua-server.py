@@ -4,12 +4,27 @@
 支持完整的安全通信：传输层加密 + 用户名密码认证
 """
 
+import os
 import sys
+import hmac
+import time
+import json
+import math
 import random
+import hashlib
 import asyncio
 import logging
+import yaml
+import numpy as np
+from collections import OrderedDict
+from datetime import datetime, timezone
 from asyncua import Server, ua
 from asyncua.ua import VariantType, SecurityPolicyType
+from asyncua.crypto.permission_rules import User, UserRole
+from asyncua.server import server as asyncua_server
+from asyncua.server.binary_server_asyncio import BinaryServer, OPCUAProtocol
+from asyncua.server.internal_session import InternalSession
+from profiling import RuntimeProfiler, timed
 
 # ============================================================================
 # 日志配置
@@ -38,12 +53,38 @@ NAMESPACE_URI = "http://litho-monitor.com/ua"
 CERT_PATH = "certs/server-cert.pem"
 KEY_PATH = "certs/server-key.pem"
 
-# 用户数据库
+# 扩展地址空间模型文件 (YAML/JSON)，为空则只创建内置节点
+MODEL_PATH = os.getenv('SIMULATOR_MODEL', '')
+
+# 数据模拟
+SIMULATION_PERIOD = 2  # 模拟周期（秒）
+WRITE_CHUNK_SIZE = int(os.getenv('SIMULATOR_WRITE_CHUNK', '500'))  # 生成变量每写入多少个让出一次事件循环
+
+# 用户数据库（PBKDF2 哈希，生成方式: python opc-ua-server.py --hash-password <密码>）
 USERS = {
-    "admin": "password123",      # 读写权限
-    "monitor": "monitor456"      # 只读权限
+    "admin": {                   # 读写权限
+        "hash": "pbkdf2_sha256$200000$bbf260ff4a0efb57da06bcd0ccb40222$"
+                "87c93b2c8215e64057518f62ecaafb3ca4698dec965fb00047390e477163ff3e",
+        "role": UserRole.Admin,
+        "max_sessions": 5,
+    },
+    "monitor": {                 # 只读权限
+        "hash": "pbkdf2_sha256$200000$f3119688743e3df260f1ce53dab9fde0$"
+                "57144715ade01f17a4119b00da0638eb8d149fb864b7254a9d9d1ecb4d4035e9",
+        "role": UserRole.User,
+        "max_sessions": None,    # 仅受服务器总会话数限制
+    },
 }
 
+# 会话准入控制
+MAX_SESSIONS = int(os.getenv('SERVER_MAX_SESSIONS', '1000'))
+MAX_HANDSHAKES = int(os.getenv('SERVER_MAX_HANDSHAKES', '16'))
+CREDENTIAL_CACHE_SIZE = int(os.getenv('SERVER_CREDENTIAL_CACHE_SIZE', '256'))
+AUTH_BACKOFF = float(os.getenv('SERVER_AUTH_BACKOFF', '1'))              # 首次验证失败后的冷却秒数
+AUTH_BACKOFF_MAX = 60
+HANDSHAKE_TIMEOUT = float(os.getenv('SERVER_HANDSHAKE_TIMEOUT', '10'))    # 放行后未激活会话则断开
+HANDSHAKE_QUEUE_TIMEOUT = float(os.getenv('SERVER_HANDSHAKE_QUEUE_TIMEOUT', '60'))  # 排队等待上限
+
 # ============================================================================
 # 数据模型
 # ============================================================================
@@ -72,17 +113,399 @@ class LithoMachineData:
         self.temperature = 22.5          # °C
         self.alarm_message = ""
 
+# ============================================================================
+# 认证与准入控制
+# ============================================================================
+def hash_password(password, iterations=200000):
+    """生成 PBKDF2-SHA256 密码哈希"""
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password, encoded):
+    """校验密码与 PBKDF2-SHA256 哈希是否匹配"""
+    algorithm, iterations, salt, expected = encoded.split('$')
+    if algorithm != 'pbkdf2_sha256':
+        raise ValueError(f"不支持的哈希算法: {algorithm}")
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), bytes.fromhex(salt), int(iterations))
+    return hmac.compare_digest(digest.hex(), expected)
+
+
+class CredentialStore:
+    """哈希凭据存储（asyncua UserManager 接口）
+
+    PBKDF2 校验故意很慢，验证通过的凭据以进程内随机密钥做 HMAC 摘要后
+    放入有界 LRU 缓存，重连风暴中同一用户的重复激活无需再次计算哈希。
+    
+    PBKDF2 在事件循环中同步执行（约 0.1 秒），为防止错误密码反复触发，
+    验证失败的（用户名, 密码摘要）进入冷却期（AUTH_BACKOFF 起按失败次数
+    翻倍，最长 AUTH_BACKOFF_MAX 秒），冷却期内同一错误密码直接拒绝。冷却
+    只针对该错误密码，多个采集端共用账号时，个别端的过期密码不会挡住
+    其他端的正确密码；失败记录与凭据缓存一样有界。
+    """
+    
+    def __init__(self, users, admission=None, cache_size=CREDENTIAL_CACHE_SIZE):
+        self.users = users
+        self.admission = admission
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_key = os.urandom(32)
+        self._failures = OrderedDict()  # (用户名, 密码摘要) -> (连续失败次数, 冷却结束时间)
+    
+    def get_user(self, iserver, username=None, password=None, certificate=None):
+        """验证用户凭据，失败返回 None"""
+        entry = self.users.get(username)
+        if entry is None or password is None or not self._verify(username, password, entry['hash']):
+            logger.warning(f"🔍 用户验证失败: {username}")
+            return None
+        
+        if self.admission:
+            self.admission.check_user(username, entry.get('max_sessions'))
+        logger.debug(f"🔍 用户验证成功: {username}")
+        return User(role=entry['role'], name=username)
+    
+    def _verify(self, username, password, encoded):
+        """先查缓存，未命中再做 PBKDF2 校验"""
+        token = hmac.new(self._cache_key, password.encode(), hashlib.sha256).digest()
+        cached = self._cache.get(username)
+        if cached is not None and hmac.compare_digest(cached, token):
+            self._cache.move_to_end(username)
+            return True
+        
+        key = (username, token)
+        failures, until = self._failures.get(key, (0, 0.0))
+        now = time.monotonic()
+        if now < until:
+            logger.warning(f"⏳ 用户 {username} 的错误密码冷却中，剩余 {until - now:.1f} 秒")
+            return False
+        
+        if not verify_password(password, encoded):
+            failures += 1
+            backoff = min(AUTH_BACKOFF * 2 ** (failures - 1), AUTH_BACKOFF_MAX)
+            self._remember(self._failures, key, (failures, now + backoff))
+            return False
+        
+        self._remember(self._cache, username, token)
+        return True
+    
+    def _remember(self, entries, key, value):
+        """写入有界 LRU 表"""
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.cache_size:
+            entries.popitem(last=False)
+
+
+class SessionAdmission:
+    """会话准入控制
+
+    - 总会话数: 超过 MAX_SESSIONS 时拒绝激活 (BadMaxConnectionsReached)
+    - 单用户会话数: 超过用户的 max_sessions 时拒绝激活 (BadTooManySessions)
+    - 并发握手数: 新连接在 connection_made 中登记，超过 MAX_HANDSHAKES 时在
+      读取任何数据之前暂停读取，按到达顺序排队；前面的连接激活会话、断开或
+      超时后立即放行下一个，Hello/OpenSecureChannel 的 RSA 运算也受限
+    - 握手超时: 放行后 HANDSHAKE_TIMEOUT 秒内未激活会话的连接被断开，释放
+      配额；排队超过 HANDSHAKE_QUEUE_TIMEOUT 秒的连接同样断开。两者取代
+      asyncua 自带的激活超时（后者从建立连接起计时，会把排队时间算进去）
+    
+    连接由 AdmissionProtocol 在建立和断开时通知，需在服务器启动前 attach。
+    """
+    
+    def __init__(self, max_handshakes=MAX_HANDSHAKES, max_sessions=MAX_SESSIONS,
+                 handshake_timeout=HANDSHAKE_TIMEOUT, queue_timeout=HANDSHAKE_QUEUE_TIMEOUT):
+        self.max_handshakes = max_handshakes
+        self.max_sessions = max_sessions
+        self.handshake_timeout = handshake_timeout
+        self.queue_timeout = queue_timeout
+        self.connections = set()
+        self.queue = OrderedDict()  # 排队中的协议 -> 排队超时定时器
+        self.admitted = {}          # 握手中的协议 -> 握手超时定时器
+    
+    def attach(self, server):
+        """登记到 asyncua 服务器，须在 server.start() 之前调用"""
+        server.iserver.admission = self
+        InternalSession.max_connections = self.max_sessions
+        if hasattr(server.iserver, 'max_pending_activation_seconds'):
+            server.iserver.max_pending_activation_seconds = 0
+    
+    def check_user(self, username, limit):
+        """检查单用户会话数"""
+        if limit and self.active_sessions(username) >= limit:
+            logger.warning(f"🚫 用户 {username} 会话数已达上限 ({limit})")
+            raise ua.UaStatusCodeError(ua.StatusCodes.BadTooManySessions)
+    
+    def active_sessions(self, username=None):
+        """已激活的会话数（可按用户过滤）"""
+        count = 0
+        for protocol in self.connections:
+            session = protocol.processor.session
+            if session is None or not session.is_activated():
+                continue
+            if username is None or getattr(session.user, 'name', None) == username:
+                count += 1
+        return count
+    
+    # ------------------------------------------------------------------------
+    # 连接事件（由 AdmissionProtocol 调用）
+    # ------------------------------------------------------------------------
+    def connection_made(self, protocol):
+        """新连接：有配额则放行，否则在首次读取前暂停"""
+        self.connections.add(protocol)
+        if len(self.admitted) < self.max_handshakes:
+            self._admit(protocol)
+        else:
+            protocol.transport.pause_reading()
+            self.queue[protocol] = self._timer(self.queue_timeout, self._expire, protocol, "排队超时")
+    
+    def message_processed(self, protocol):
+        """每条消息处理后检查握手是否完成"""
+        if protocol in self.admitted and self._is_activated(protocol):
+            self._release(protocol)
+    
+    def connection_lost(self, protocol):
+        """连接断开：释放配额或移出队列"""
+        self.connections.discard(protocol)
+        handle = self.queue.pop(protocol, None)
+        if handle is not None:
+            handle.cancel()
+        self._release(protocol)
+    
+    # ------------------------------------------------------------------------
+    # 配额
+    # ------------------------------------------------------------------------
+    def _admit(self, protocol):
+        self.admitted[protocol] = self._timer(self.handshake_timeout, self._expire, protocol, "握手超时")
+    
+    def _release(self, protocol):
+        """释放握手配额，并按到达顺序放行排队的连接"""
+        handle = self.admitted.pop(protocol, None)
+        if handle is None:
+            return
+        handle.cancel()
+        
+        while self.queue and len(self.admitted) < self.max_handshakes:
+            waiting, handle = self.queue.popitem(last=False)
+            handle.cancel()
+            if waiting.transport.is_closing():
+                continue
+            self._admit(waiting)
+            waiting.transport.resume_reading()
+    
+    def _expire(self, protocol, reason):
+        """超时断开连接（connection_lost 随后释放配额）"""
+        logger.warning(f"🚫 {reason}，断开连接: {protocol.peer_name}")
+        protocol.transport.close()
+    
+    @staticmethod
+    def _timer(delay, callback, *args):
+        return asyncio.get_running_loop().call_later(delay, callback, *args)
+    
+    @staticmethod
+    def _is_activated(protocol):
+        session = protocol.processor.session
+        return session is not None and session.is_activated()
+
+
+class AdmissionProtocol(OPCUAProtocol):
+    """向 SessionAdmission 报告连接事件的 OPC UA 协议对象"""
+    
+    def __init__(self, admission, **kwargs):
+        super().__init__(**kwargs)
+        self.admission = admission
+        self.registered = False
+    
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        # 达到 asyncua max_connections 时父类直接关闭连接，不设置 transport
+        if self.transport is not None:
+            self.registered = True
+            self.admission.connection_made(self)
+    
+    def connection_lost(self, ex):
+        super().connection_lost(ex)
+        if self.registered:
+            self.registered = False
+            self.admission.connection_lost(self)
+    
+    async def _process_one_msg(self, header, buf):
+        try:
+            return await super()._process_one_msg(header, buf)
+        finally:
+            self.admission.message_processed(self)
+
+
+class AdmissionBinaryServer(BinaryServer):
+    """为登记了 SessionAdmission 的服务器创建 AdmissionProtocol"""
+    
+    def _make_protocol(self):
+        admission = getattr(self.iserver, 'admission', None)
+        if admission is None:
+            return super()._make_protocol()
+        return AdmissionProtocol(
+            admission,
+            iserver=self.iserver,
+            policies=self._policies,
+            clients=self.clients,
+            closing_tasks=self.closing_tasks,
+            limits=self.limits,
+        )
+
+
+# asyncua 在 Server.start() 内部创建 BinaryServer，替换模块中的类以接管协议工厂
+asyncua_server.BinaryServer = AdmissionBinaryServer
+
+# ============================================================================
+# 地址空间模型
+# ============================================================================
+class AddressSpaceModel:
+    """声明式地址空间模型
+
+    模型格式（YAML 或 JSON）::
+
+        folders:
+          - name: Sensors
+            variables:
+              - name: "Temp{index:05d}"   # count > 1 时按序号展开
+                count: 10000
+                type: Double
+                value: 22.0
+                generator: {kind: walk, step: 0.05, min: 18, max: 26}
+                group: 250                 # 每 250 个变量归入一个子文件夹
+    
+    asyncua 向父节点添加引用时会线性查重，单个文件夹下子节点越多，
+    建点耗时越接近平方增长，大规模模板应使用 group 分组。
+    """
+    
+    def __init__(self, folders):
+        self.folders = folders
+    
+    @classmethod
+    def load(cls, path):
+        """从 YAML/JSON 文件加载模型"""
+        with open(path, encoding='utf-8') as f:
+            if path.endswith(('.yaml', '.yml')):
+                raw = yaml.safe_load(f)
+            else:
+                raw = json.load(f)
+        return cls(raw.get('folders', []))
+    
+    @staticmethod
+    def expand(spec):
+        """展开变量模板，逐个返回 (名称, 序号, 总数)"""
+        count = int(spec.get('count', 1))
+        for i in range(count):
+            yield AddressSpaceModel.name_at(spec, i), i, count
+    
+    @staticmethod
+    def name_at(spec, i):
+        """模板第 i 个变量的名称"""
+        return spec['name'].format(index=int(spec.get('start', 0)) + i)
+    
+    def variable_count(self):
+        """模型中的变量总数"""
+        return sum(int(v.get('count', 1)) for f in self.folders for v in f.get('variables', []))
+
+
+class VariableStore:
+    """生成变量的数组化状态存储
+
+    每个变量只占各数组中的一个槽位，每个模拟周期向量化更新全部数值。
+    支持的生成器: constant, random, walk, counter, sine
+    """
+    
+    KINDS = {'constant': 0, 'random': 1, 'walk': 2, 'counter': 3, 'sine': 4}
+    INTEGER_TYPES = {
+        VariantType.SByte, VariantType.Byte, VariantType.Int16, VariantType.UInt16,
+        VariantType.Int32, VariantType.UInt32, VariantType.Int64, VariantType.UInt64,
+    }
+    
+    def __init__(self):
+        self.nodeids = []
+        self.variant_types = []
+        self._rows = []  # (kind, value, p1, p2, p3, phase)
+        self.rng = np.random.default_rng()
+    
+    def __len__(self):
+        return len(self.nodeids)
+    
+    def add(self, nodeid, variant_type, value, generator, index=0, count=1):
+        """登记一个生成变量"""
+        kind = generator.get('kind', 'constant')
+        if kind not in self.KINDS:
+            raise ValueError(f"未知的生成器类型: {kind}")
+        if variant_type not in self.INTEGER_TYPES | {VariantType.Float, VariantType.Double}:
+            raise ValueError(f"生成器只支持数值类型: {variant_type.name}")
+        
+        if kind == 'random':
+            params = (generator.get('min', 0.0), generator.get('max', 1.0), 0.0)
+        elif kind == 'walk':
+            params = (generator.get('min', -math.inf), generator.get('max', math.inf),
+                      generator.get('step', 1.0))
+        elif kind == 'counter':
+            params = (generator.get('step', 1), 0.0, 0.0)
+        elif kind == 'sine':
+            params = (generator.get('amplitude', 1.0), generator.get('period', 60.0),
+                      generator.get('offset', value))
+        else:
+            params = (0.0, 0.0, 0.0)
+        
+        phase = 2 * math.pi * index / count
+        self.nodeids.append(nodeid)
+        self.variant_types.append(variant_type)
+        self._rows.append((self.KINDS[kind], float(value), *map(float, params), phase))
+    
+    def freeze(self):
+        """将登记的变量压缩为数组"""
+        rows = np.array(self._rows, dtype=np.float64).reshape(-1, 6)
+        self._rows = []
+        self.kind = rows[:, 0].astype(np.int8)
+        self.values = rows[:, 1].copy()
+        self.p1, self.p2, self.p3, self.phase = rows[:, 2], rows[:, 3], rows[:, 4], rows[:, 5]
+        self.is_integer = np.array([vt in self.INTEGER_TYPES for vt in self.variant_types], dtype=bool)
+        self.dynamic = np.flatnonzero(self.kind != self.KINDS['constant'])
+    
+    def step(self, t):
+        """推进一个模拟周期，返回数值变化的槽位"""
+        kinds = self.KINDS
+        values = self.values
+        
+        mask = self.kind == kinds['random']
+        values[mask] = self.p1[mask] + self.rng.random(mask.sum()) * (self.p2[mask] - self.p1[mask])
+        
+        mask = self.kind == kinds['walk']
+        walked = values[mask] + self.rng.standard_normal(mask.sum()) * self.p3[mask]
+        values[mask] = np.clip(walked, self.p1[mask], self.p2[mask])
+        
+        mask = self.kind == kinds['counter']
+        values[mask] += self.p1[mask]
+        
+        mask = self.kind == kinds['sine']
+        values[mask] = self.p3[mask] + self.p1[mask] * np.sin(2 * math.pi * t / self.p2[mask] + self.phase[mask])
+        
+        values[self.is_integer] = np.round(values[self.is_integer])
+        return self.dynamic
+
 # ============================================================================
 # OPC UA 服务器
 # ============================================================================
 class LithoMachineServer:
     """光刻机 OPC UA 服务器"""
     
-    def __init__(self):
+    def __init__(self, endpoint=SERVER_ENDPOINT, name=SERVER_NAME, model_path=MODEL_PATH):
+        self.endpoint = endpoint
+        self.name = name
+        self.model_path = model_path
         self.server = None
         self.ns_idx = None
         self.data = LithoMachineData()
         self.nodes = {}
+        self.store = VariableStore()
+        self.admission = SessionAdmission()
+        self.credentials = CredentialStore(USERS, self.admission)
+        self.profiler = RuntimeProfiler("server")
+        self.node_count = 0
+        self._next_id = 1
     
     # ------------------------------------------------------------------------
     # 初始化
@@ -91,12 +514,13 @@ class LithoMachineServer:
         """初始化服务器"""
         self._log_header("正在初始化光刻机数据模拟器")
         
-        self.server = Server()
+        self.server = Server(user_manager=self.credentials)
         await self.server.init()
+        self.admission.attach(self.server)
         
         # 配置端点
-        self.server.set_endpoint(SERVER_ENDPOINT)
-        self.server.set_server_name(SERVER_NAME)
+        self.server.set_endpoint(self.endpoint)
+        self.server.set_server_name(self.name)
         
         # 配置安全
         await self._configure_security()
@@ -124,74 +548,153 @@ class LithoMachineServer:
         await self.server.load_certificate(CERT_PATH)
         await self.server.load_private_key(KEY_PATH)
         
-        # 用户认证
+        # 用户认证（凭据校验见 CredentialStore）
         logger.info("🔐 配置用户认证...")
         self.server.set_security_IDs(["Username"])
-        self.server.user_manager = self._check_credentials
         
         # 应用程序 URI
         await self.server.set_application_uri("urn:localhost:OPCUA:LithoServer")
     
-    @staticmethod
-    def _check_credentials(username, password):
-        """验证用户凭据"""
-        result = USERS.get(username) == password
-        status = "成功" if result else "失败"
-        logger.info(f"🔍 用户验证{status}: {username}")
-        return result
-    
     # ------------------------------------------------------------------------
     # 地址空间
     # ------------------------------------------------------------------------
     async def _create_nodes(self):
-        """创建 OPC UA 地址空间"""
+        """根据模型批量创建 OPC UA 地址空间"""
         logger.info("📊 创建数据节点...")
         
+        model = self._core_model()
+        if self.model_path:
+            extra = AddressSpaceModel.load(self.model_path)
+            logger.info(f"📁 加载地址空间模型: {self.model_path} ({extra.variable_count()} 个变量)")
+            model.folders.extend(extra.folders)
+        
         objects = self.server.get_objects_node()
-        machine = await objects.add_object(self.ns_idx, "LithographyMachine")
-        
-        # 按类别创建节点
-        await self._create_identification_nodes(machine)
-        await self._create_state_nodes(machine)
-        await self._create_process_nodes(machine)
-        await self._create_health_nodes(machine)
-        
-        logger.info(f"✅ 创建了 {len(self.nodes)} 个数据节点")
-    
-    async def _create_identification_nodes(self, parent):
-        """创建身份信息节点"""
-        folder = await parent.add_folder(self.ns_idx, "Identification")
-        await self._add_node(folder, "VendorID", self.data.vendor_id, VariantType.String)
-        await self._add_node(folder, "SerialNumber", self.data.serial_number, VariantType.String)
-        await self._add_node(folder, "ModelName", self.data.model_name, VariantType.String)
-    
-    async def _create_state_nodes(self, parent):
-        """创建状态节点"""
-        folder = await parent.add_folder(self.ns_idx, "State")
-        await self._add_node(folder, "MachineStatus", self.data.machine_status, VariantType.Int32)
-        await self._add_node(folder, "IsSelected", self.data.is_selected, VariantType.Boolean)
-    
-    async def _create_process_nodes(self, parent):
-        """创建工艺数据节点"""
-        folder = await parent.add_folder(self.ns_idx, "Process")
-        await self._add_node(folder, "WaferCount", self.data.wafer_count, VariantType.UInt32)
-        await self._add_node(folder, "ExposureEnergy", self.data.exposure_energy, VariantType.Double)
-        await self._add_node(folder, "DoseError", self.data.dose_error, VariantType.Double)
-        await self._add_node(folder, "OverlayPrecision", self.data.overlay_precision, VariantType.Double)
-    
-    async def _create_health_nodes(self, parent):
-        """创建健康状态节点"""
-        folder = await parent.add_folder(self.ns_idx, "Health")
-        await self._add_node(folder, "LaserPulseCount", self.data.laser_pulse_count, VariantType.UInt64)
-        await self._add_node(folder, "StageVibration", self.data.stage_vibration, VariantType.Double)
-        await self._add_node(folder, "Temperature", self.data.temperature, VariantType.Double)
-        await self._add_node(folder, "AlarmMessage", self.data.alarm_message, VariantType.String)
-    
-    async def _add_node(self, folder, name, value, variant_type):
-        """添加只读变量节点"""
-        node = await folder.add_variable(self.ns_idx, name, value, variant_type)
-        await node.set_writable(False)
-        self.nodes[name] = node
+        machine_id = self._allocate_nodeid()
+        items = [self._object_item(
+            machine_id, objects.nodeid, "LithographyMachine",
+            ua.ObjectIds.Organizes, ua.ObjectIds.BaseObjectType
+        )]
+        for folder in model.folders:
+            items.extend(self._folder_items(machine_id, folder))
+        
+        # 单次 AddNodes 批量提交
+        results = await self.server.iserver.isession.add_nodes(items)
+        for result in results:
+            result.StatusCode.check()
+        self.store.freeze()
+        
+        self.node_count = sum(item.NodeClass == ua.NodeClass.Variable for item in items)
+        logger.info(f"✅ 创建了 {self.node_count} 个数据节点")
+    
+    def _core_model(self):
+        """内置的光刻机节点模型（状态机驱动）"""
+        d = self.data
+        return AddressSpaceModel([
+            {'name': 'Identification', 'variables': [
+                {'name': 'VendorID', 'type': 'String', 'value': d.vendor_id},
+                {'name': 'SerialNumber', 'type': 'String', 'value': d.serial_number},
+                {'name': 'ModelName', 'type': 'String', 'value': d.model_name},
+            ]},
+            {'name': 'State', 'variables': [
+                {'name': 'MachineStatus', 'type': 'Int32', 'value': d.machine_status},
+                {'name': 'IsSelected', 'type': 'Boolean', 'value': d.is_selected},
+            ]},
+            {'name': 'Process', 'variables': [
+                {'name': 'WaferCount', 'type': 'UInt32', 'value': d.wafer_count},
+                {'name': 'ExposureEnergy', 'type': 'Double', 'value': d.exposure_energy},
+                {'name': 'DoseError', 'type': 'Double', 'value': d.dose_error},
+                {'name': 'OverlayPrecision', 'type': 'Double', 'value': d.overlay_precision},
+            ]},
+            {'name': 'Health', 'variables': [
+                {'name': 'LaserPulseCount', 'type': 'UInt64', 'value': d.laser_pulse_count},
+                {'name': 'StageVibration', 'type': 'Double', 'value': d.stage_vibration},
+                {'name': 'Temperature', 'type': 'Double', 'value': d.temperature},
+                {'name': 'AlarmMessage', 'type': 'String', 'value': d.alarm_message},
+            ]},
+        ])
+    
+    def _folder_items(self, parent_id, folder):
+        """生成文件夹及其变量的 AddNodesItem"""
+        folder_id = self._allocate_nodeid()
+        yield self._object_item(
+            folder_id, parent_id, folder['name'],
+            ua.ObjectIds.HasComponent, ua.ObjectIds.FolderType
+        )
+        
+        for spec in folder.get('variables', []):
+            variant_type = getattr(VariantType, spec['type'])
+            value = spec.get('value', '' if variant_type == VariantType.String else 0)
+            generator = spec.get('generator')
+            group = int(spec.get('group', 0))
+            parent_id = folder_id
+            
+            for name, index, count in AddressSpaceModel.expand(spec):
+                # 内置节点先创建，重名会让 _write_node 写到模型节点上
+                if name in self.nodes:
+                    raise ValueError(f"模型变量与已有节点重名: {name}")
+                
+                if group and index % group == 0:
+                    parent_id = self._allocate_nodeid()
+                    last = AddressSpaceModel.name_at(spec, min(index + group, count) - 1)
+                    yield self._object_item(
+                        parent_id, folder_id, f"{name}~{last}",
+                        ua.ObjectIds.HasComponent, ua.ObjectIds.FolderType
+                    )
+                
+                nodeid = self._allocate_nodeid()
+                yield self._variable_item(nodeid, parent_id, name, value, variant_type)
+                
+                if generator:
+                    self.store.add(nodeid, variant_type, value, generator, index, count)
+                elif count == 1:
+                    self.nodes[name] = self.server.get_node(nodeid)
+    
+    def _allocate_nodeid(self):
+        """按创建顺序分配数字 NodeId（与原逐个创建的编号一致）"""
+        nodeid = ua.NodeId(self._next_id, self.ns_idx)
+        self._next_id += 1
+        return nodeid
+    
+    def _object_item(self, nodeid, parent_id, name, reference_type, type_definition):
+        """构造对象/文件夹节点的 AddNodesItem"""
+        attrs = ua.ObjectAttributes()
+        attrs.DisplayName = ua.LocalizedText(name)
+        attrs.Description = ua.LocalizedText(name)
+        attrs.EventNotifier = 0
+        attrs.WriteMask = 0
+        attrs.UserWriteMask = 0
+        return ua.AddNodesItem(
+            ParentNodeId=parent_id,
+            ReferenceTypeId=ua.NodeId(reference_type),
+            RequestedNewNodeId=nodeid,
+            BrowseName=ua.QualifiedName(name, self.ns_idx),
+            NodeClass=ua.NodeClass.Object,
+            NodeAttributes=attrs,
+            TypeDefinition=ua.NodeId(type_definition),
+        )
+    
+    def _variable_item(self, nodeid, parent_id, name, value, variant_type):
+        """构造只读变量节点的 AddNodesItem"""
+        attrs = ua.VariableAttributes()
+        attrs.DisplayName = ua.LocalizedText(name)
+        attrs.Description = ua.LocalizedText(name)
+        attrs.Value = ua.Variant(value, variant_type)
+        attrs.DataType = ua.NodeId(getattr(ua.ObjectIds, variant_type.name))
+        attrs.ValueRank = ua.ValueRank.Scalar
+        attrs.AccessLevel = ua.AccessLevel.CurrentRead.mask
+        attrs.UserAccessLevel = ua.AccessLevel.CurrentRead.mask
+        attrs.WriteMask = 0
+        attrs.UserWriteMask = 0
+        attrs.Historizing = False
+        return ua.AddNodesItem(
+            ParentNodeId=parent_id,
+            ReferenceTypeId=ua.NodeId(ua.ObjectIds.HasComponent),
+            RequestedNewNodeId=nodeid,
+            BrowseName=ua.QualifiedName(name, self.ns_idx),
+            NodeClass=ua.NodeClass.Variable,
+            NodeAttributes=attrs,
+            TypeDefinition=ua.NodeId(ua.ObjectIds.BaseDataVariableType),
+        )
     
     # ------------------------------------------------------------------------
     # 运行
@@ -200,18 +703,21 @@ class LithoMachineServer:
         """启动服务器"""
         async with self.server:
             self._log_startup_info()
-            await self._simulate_data()
+            self.profiler.install()
+            try:
+                await self._simulate_data()
+            finally:
+                self.profiler.shutdown()
     
     def _log_startup_info(self):
         """打印启动信息"""
         self._log_header("光刻机数据模拟器启动成功")
         logger.info("📡 OPC UA 端点: opc.tcp://localhost:4840")
         logger.info("🏭 命名空间: http://litho-monitor.com/ua")
-        logger.info("📊 数据节点: 13个")
+        logger.info(f"📊 数据节点: {self.node_count}个")
         logger.info("🔐 安全模式: Basic256Sha256 + SignAndEncrypt")
-        logger.info("👤 用户账号:")
-        logger.info("   - admin/password123 (读写)")
-        logger.info("   - monitor/monitor456 (只读)")
+        logger.info("👤 用户账号: admin (读写), monitor (只读)")
+        logger.info(f"🚦 准入控制: 最大会话 {MAX_SESSIONS}, 最大并发握手 {MAX_HANDSHAKES}")
         self._log_separator()
     
     # ------------------------------------------------------------------------
@@ -221,13 +727,20 @@ class LithoMachineServer:
         """模拟光刻机数据变化"""
         logger.info("🔄 开始数据模拟...")
         
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
         try:
             while True:
                 await self._update_machine_state()
-                await asyncio.sleep(2)
+                await self._update_generated(loop.time())
+                
+                # 按固定节拍推进，更新耗时不累积为周期漂移
+                deadline = max(deadline + SIMULATION_PERIOD, loop.time())
+                await asyncio.sleep(deadline - loop.time())
         except asyncio.CancelledError:
             logger.info("🛑 数据模拟已停止")
     
+    @timed()
     async def _update_machine_state(self):
         """更新机器状态"""
         if self.data.machine_status == MachineStatus.IDLE:
@@ -296,6 +809,29 @@ class LithoMachineServer:
             await self._write_node("AlarmMessage", self.data.alarm_message, ua.VariantType.String)
             logger.info("✅ 报警清除")
     
+    @timed()
+    async def _update_generated(self, t):
+        """更新模型中的生成变量"""
+        if not len(self.store):
+            return
+        
+        changed = self.store.step(t).tolist()
+        values = self.store.values.tolist()
+        is_integer = self.store.is_integer.tolist()
+        nodeids = self.store.nodeids
+        variant_types = self.store.variant_types
+        now = datetime.now(timezone.utc)
+        
+        # write_attribute_value 不会真正挂起，每写入一批主动让出事件循环，
+        # 避免数万次写入连续占用循环、阻塞发布与握手
+        # （isession.write 批量接口会逐项复制 DataValue，反而更慢）
+        for n, i in enumerate(changed, 1):
+            value = int(values[i]) if is_integer[i] else values[i]
+            datavalue = ua.DataValue(ua.Variant(value, variant_types[i]), SourceTimestamp=now)
+            await self.server.write_attribute_value(nodeids[i], datavalue)
+            if n % WRITE_CHUNK_SIZE == 0:
+                await asyncio.sleep(0)
+    
     async def _write_node(self, name, value, variant_type):
         """写入节点值"""
         await self.nodes[name].write_value(ua.Variant(value, variant_type))
@@ -331,6 +867,10 @@ async def main():
         sys.exit(1)
 
 if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--hash-password":
+        print(hash_password(sys.argv[2]))
+        sys.exit(0)
+    
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
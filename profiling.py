@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+运行时性能剖析 (Runtime Profiling)
+服务器与客户端共用：无需重启即可开关采样剖析、事件循环阻塞检测、协程耗时统计
+"""
+
+import os
+import time
+import signal
+import inspect
+import asyncio
+import logging
+import cProfile
+import functools
+from datetime import datetime
+
+try:
+    import yappi
+except ImportError:
+    yappi = None
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# 协程耗时统计
+# ============================================================================
+class TimingStats:
+    """单个函数的调用耗时"""
+    
+    __slots__ = ('count', 'total', 'max')
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+
+TIMINGS = {}
+
+
+def timed(name=None):
+    """记录函数/协程每次调用的耗时（开销为两次 perf_counter）"""
+    def decorator(func):
+        key = name or func.__qualname__
+        stats = TIMINGS.setdefault(key, TimingStats())
+        
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    stats.add(time.perf_counter() - start)
+            return async_wrapper
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats.add(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+# ============================================================================
+# 剖析控制
+# ============================================================================
+class RuntimeProfiler:
+    """运行时剖析控制器
+    
+    - SIGUSR1: 开始/停止采样剖析，停止时写入 PROFILE_DIR
+    - SIGUSR2: 输出协程耗时统计
+    - PROFILE_ENABLED=1: 启动即开始剖析
+    - PROFILE_ENGINE: cprofile（默认）或 yappi（需安装，按墙钟统计协程）
+    - SLOW_CALLBACK_MS: 事件循环被阻塞超过该阈值时告警（0 为关闭）
+    
+    阻塞检测使用轻量探针：每隔 LAG_PROBE_INTERVAL 休眠一次，按唤醒延迟
+    估计阻塞时长，不开启 asyncio 调试模式。探针只报告阻塞时长，定位具体
+    回调需配合 SIGUSR1 采样剖析。
+    """
+    
+    LAG_PROBE_INTERVAL = 0.1  # 秒
+    
+    def __init__(self, name):
+        self.name = name
+        self.output_dir = os.getenv('PROFILE_DIR', 'profiles')
+        self.engine = os.getenv('PROFILE_ENGINE', 'cprofile').lower()
+        self.autostart = os.getenv('PROFILE_ENABLED', '0').lower() in ('1', 'true', 'yes')
+        self.slow_callback_ms = float(os.getenv('SLOW_CALLBACK_MS', '0'))
+        self._profile = None
+        self._lag_task = None
+        
+        if self.engine == 'yappi' and yappi is None:
+            logger.warning("⚠️  未安装 yappi，改用 cProfile")
+            self.engine = 'cprofile'
+    
+    @property
+    def running(self):
+        return self._profile is not None
+    
+    def install(self):
+        """挂载到当前事件循环"""
+        loop = asyncio.get_running_loop()
+        
+        if self.slow_callback_ms > 0:
+            self._lag_task = loop.create_task(self._probe_lag())
+            logger.info(f"🐢 事件循环阻塞检测: 阈值 {self.slow_callback_ms:g}ms")
+        
+        if hasattr(signal, 'SIGUSR1'):
+            loop.add_signal_handler(signal.SIGUSR1, self.toggle)
+            loop.add_signal_handler(signal.SIGUSR2, self.report)
+            logger.info(f"🔬 剖析控制: kill -USR1 {os.getpid()} 开关采样, kill -USR2 {os.getpid()} 输出耗时")
+        
+        if self.autostart:
+            self.start()
+    
+    async def _probe_lag(self):
+        """按休眠的唤醒延迟估计事件循环被阻塞的时长"""
+        loop = asyncio.get_running_loop()
+        threshold = self.slow_callback_ms / 1000
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.LAG_PROBE_INTERVAL)
+            lag = loop.time() - start - self.LAG_PROBE_INTERVAL
+            if lag > threshold:
+                logger.warning(
+                    f"🐢 事件循环阻塞 {lag * 1000:.0f}ms（阈值 {self.slow_callback_ms:g}ms），"
+                    f"可 kill -USR1 {os.getpid()} 剖析定位"
+                )
+    
+    def toggle(self):
+        """开关采样剖析"""
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+    
+    def start(self):
+        """开始采样剖析"""
+        if self.running:
+            return
+        
+        if self.engine == 'yappi':
+            yappi.set_clock_type('wall')
+            yappi.start()
+            self._profile = yappi
+        else:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        logger.info(f"🔬 开始剖析 ({self.engine})")
+    
+    def stop(self):
+        """停止剖析并写入文件，返回文件路径"""
+        if not self.running:
+            return None
+        
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(self.output_dir, f"{self.name}-{stamp}.prof")
+        
+        if self.engine == 'yappi':
+            yappi.stop()
+            yappi.get_func_stats().save(path, type='pstat')
+            yappi.clear_stats()
+        else:
+            self._profile.disable()
+            self._profile.dump_stats(path)
+        self._profile = None
+        
+        logger.info(f"🔬 剖析结果已保存: {path} (python -m pstats {path})")
+        return path
+    
+    def report(self):
+        """输出协程耗时统计"""
+        logger.info("⏱️  协程耗时统计:")
+        for key, stats in sorted(TIMINGS.items()):
+            if not stats.count:
+                continue
+            avg = stats.total / stats.count * 1000
+            logger.info(
+                f"   {key}: {stats.count}次, 平均 {avg:.2f}ms, "
+                f"最大 {stats.max * 1000:.2f}ms, 合计 {stats.total:.2f}s"
+            )
+    
+    def shutdown(self):
+        """退出前保存未完成的剖析"""
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        self.stop()
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+长时间运行浸泡测试 (Soak Test)
+在加速时钟下同进程运行模拟器与客户端，用几分钟模拟数天运行：
+定期采样内存 (RSS)、对象数、通知速率、事件循环延迟，输出泄漏与吞吐漂移报告
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import functools
+import selectors
+import numpy as np
+from collections import Counter
+from datetime import datetime
+from profiling import TIMINGS
+from _scripts import load_script
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# ============================================================================
+# 浸泡测试配置
+# ============================================================================
+class SoakConfig:
+    """浸泡测试配置（时间均为虚拟时间）"""
+    
+    def __init__(self):
+        self.days = float(os.getenv('SOAK_DAYS', '3'))
+        self.speedup = float(os.getenv('SOAK_SPEEDUP', '500'))
+        self.sample_minutes = float(os.getenv('SOAK_SAMPLE_MINUTES', '15'))
+        self.warmup_hours = float(os.getenv('SOAK_WARMUP_HOURS', '2'))
+        self.modes = [m.strip() for m in os.getenv('SOAK_MODES', 'poll,subscription').split(',') if m.strip()]
+        self.lag_probe = float(os.getenv('SOAK_LAG_PROBE', '1'))
+        self.seed = int(os.getenv('SOAK_SEED', '0'))
+        self.output_dir = os.getenv('PROFILE_DIR', 'profiles')
+        
+        # 判定阈值
+        self.rss_limit_mb = float(os.getenv('SOAK_RSS_LIMIT_MB', '2'))          # 每虚拟天
+        self.object_limit = float(os.getenv('SOAK_OBJECT_LIMIT', '2000'))       # 每虚拟天
+        self.drift_limit_pct = float(os.getenv('SOAK_DRIFT_LIMIT_PCT', '10'))
+        self.cpu_drift_limit_pct = float(os.getenv('SOAK_CPU_DRIFT_LIMIT_PCT', '0'))  # 0 为仅报告不判定
+        self.lag_limit_ms = float(os.getenv('SOAK_LAG_LIMIT_MS', '50'))
+    
+    @property
+    def duration(self):
+        return self.days * 86400
+    
+    @property
+    def sample_interval(self):
+        return self.sample_minutes * 60
+
+
+soak_config = SoakConfig()
+
+# 客户端默认读取 .env，浸泡测试使用与模拟器匹配的 .env.asml
+os.environ.setdefault('DOTENV_FILE', '.env.asml')
+
+# 请求超时按虚拟时间计算，放大后保持约 10 秒真实时间（网络往返不会被加速）
+os.environ.setdefault('OPC_TIMEOUT', str(int(10 * soak_config.speedup)))
+
+# ============================================================================
+# 复用客户端与服务器实现
+# ============================================================================
+litho_client = load_script("litho_client", "opc-ua-client.py")
+litho_server = load_script("litho_server", "opc-ua-server.py")
+
+# 连接健康探测的间隔即其超时，同样按真实时间保留 1 秒
+litho_client.Client = functools.partial(litho_client.Client, watchdog_intervall=soak_config.speedup)
+
+logger = logging.getLogger("soak")
+logger.setLevel(logging.INFO)
+
+# 逐条数据与报警日志在加速运行下量过大，仅保留错误
+logging.getLogger("litho_client").setLevel(logging.ERROR)
+logging.getLogger("litho_server").setLevel(logging.ERROR)
+
+# 订阅模式每个周期取走的数据条数，与收到的通知数对比可发现重复投递的旧值
+DELIVERED = Counter()
+
+
+def _count_delivered(get_and_clear):
+    @functools.wraps(get_and_clear)
+    def wrapper(self):
+        data = get_and_clear(self)
+        DELIVERED['values'] += len(data)
+        return data
+    return wrapper
+
+
+litho_client.SubscriptionHandler.get_and_clear = _count_delivered(litho_client.SubscriptionHandler.get_and_clear)
+
+# ============================================================================
+# 加速时钟
+# ============================================================================
+class _ScaledSelector(selectors.DefaultSelector):
+    """将事件循环的等待时间按加速比缩短"""
+    
+    def __init__(self, speedup):
+        super().__init__()
+        self.speedup = speedup
+    
+    def select(self, timeout=None):
+        if timeout is not None:
+            timeout /= self.speedup
+        return super().select(timeout)
+
+
+class AcceleratedEventLoop(asyncio.SelectorEventLoop):
+    """加速事件循环：loop.time() 以 speedup 倍速前进
+    
+    asyncio.sleep、wait_for 超时、asyncua 的发布周期与保活定时器
+    都基于 loop.time()，因此服务器与客户端整体按同一比例加速。
+    """
+    
+    def __init__(self, speedup):
+        self.speedup = speedup
+        self._origin = time.monotonic()
+        super().__init__(selector=_ScaledSelector(speedup))
+    
+    def time(self):
+        return self._origin + (time.monotonic() - self._origin) * self.speedup
+
+# ============================================================================
+# 采样
+# ============================================================================
+def _rss_bytes():
+    """当前进程常驻内存"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        if resource is None:
+            return 0
+        # 非 Linux 只能取峰值
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def _cpu_seconds():
+    if resource is None:
+        return time.process_time()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _type_counts():
+    return Counter(type(obj).__name__ for obj in gc.get_objects())
+
+
+# 计入通知速率的回调（profiling.timed 统计的调用次数）
+RATE_KEYS = {
+    'notifications': ('SubscriptionHandler.datachange_notification', "订阅通知速率"),
+    'polls': ('LithoMonitorClient.read_dynamic_data', "轮询速率"),
+    'server_ticks': ('LithoMachineServer._update_machine_state', "模拟周期速率"),
+}
+
+# 客户端速率另按模拟周期归一化：事件循环跟不上加速时钟时各定时器一起变慢，
+# 每虚拟分钟的计数随之波动，每周期的计数则不受影响
+PER_TICK_KEYS = ('notifications', 'polls')
+
+
+class SoakSampler:
+    """周期采样运行指标"""
+    
+    def __init__(self):
+        self.samples = []
+        self.lags = []
+        self.type_baseline = None
+        self.type_growth = []
+        self._last = None
+    
+    async def probe_lag(self):
+        """测量事件循环延迟（真实毫秒）"""
+        expected = soak_config.lag_probe / soak_config.speedup
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(soak_config.lag_probe)
+            self.lags.append(max(time.perf_counter() - start - expected, 0.0))
+    
+    def sample(self, virtual):
+        """记录一次采样"""
+        real = time.perf_counter()
+        cpu = _cpu_seconds()
+        counts = {key: TIMINGS[name].count if name in TIMINGS else 0 for key, (name, _) in RATE_KEYS.items()}
+        
+        sample = {
+            'hours': round(virtual / 3600, 4),
+            'rss_mb': round(_rss_bytes() / 2**20, 2),
+            'objects': len(gc.get_objects()),
+            'tasks': len(asyncio.all_tasks()),
+            # 每条取走的订阅值都应对应至少一次通知，超出部分即为重复投递
+            'stale_values': max(DELIVERED['values'] - counts['notifications'], 0),
+        }
+        
+        if self._last:
+            last_virtual, last_real, last_cpu, last_counts = self._last
+            minutes = (virtual - last_virtual) / 60
+            for key in RATE_KEYS:
+                sample[f'{key}_per_min'] = round((counts[key] - last_counts[key]) / minutes, 3)
+            ticks = counts['server_ticks'] - last_counts['server_ticks']
+            if ticks:
+                for key in PER_TICK_KEYS:
+                    sample[f'{key}_per_tick'] = round((counts[key] - last_counts[key]) / ticks, 4)
+            sample['cpu_pct'] = round((cpu - last_cpu) / (real - last_real) * 100, 1)
+            sample['speedup'] = round((virtual - last_virtual) / (real - last_real), 1)
+        
+        lags, self.lags = self.lags, []
+        if lags:
+            lags.sort()
+            sample['lag_p95_ms'] = round(lags[int(len(lags) * 0.95)] * 1000, 3)
+            sample['lag_max_ms'] = round(lags[-1] * 1000, 3)
+        
+        self._last = (virtual, real, cpu, counts)
+        self.samples.append(sample)
+        return sample
+    
+    async def run(self, loop):
+        """按虚拟时间采样直至测试结束"""
+        start = loop.time()
+        warmed_up = False
+        self.sample(0)
+        
+        while True:
+            await asyncio.sleep(soak_config.sample_interval)
+            virtual = loop.time() - start
+            sample = self.sample(virtual)
+            
+            if not warmed_up and sample['hours'] >= soak_config.warmup_hours:
+                warmed_up = True
+                gc.collect()
+                self.type_baseline = _type_counts()
+            
+            if len(self.samples) % 24 == 0:
+                logger.info(
+                    f"⏳ 虚拟 {sample['hours']:.1f}h: RSS {sample['rss_mb']}MB, "
+                    f"对象 {sample['objects']}, 任务 {sample['tasks']}, "
+                    f"CPU {sample.get('cpu_pct', 0)}%, 实际加速 x{sample.get('speedup', 0)}"
+                )
+            if virtual >= soak_config.duration:
+                if self.type_baseline is not None:
+                    # 在关闭连接前统计，避免随会话释放的对象被漏掉
+                    gc.collect()
+                    self.type_growth = (_type_counts() - self.type_baseline).most_common(10)
+                return
+
+# ============================================================================
+# 报告
+# ============================================================================
+def _slope(xs, ys):
+    """最小二乘斜率"""
+    n = len(xs)
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    var = sum((x - mean_x) ** 2 for x in xs)
+    if not var:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+class SoakReport:
+    """根据采样判定泄漏与吞吐漂移"""
+    
+    def __init__(self, samples, growth):
+        self.samples = [s for s in samples if s['hours'] >= soak_config.warmup_hours]
+        self.growth = growth
+        self.findings = []
+    
+    @property
+    def failed(self):
+        return bool(self.findings)
+    
+    def analyze(self):
+        """执行全部检查"""
+        if len(self.samples) < 8:
+            self.findings.append("采样点不足（预热后少于 8 个），请增加 SOAK_DAYS 或减小 SOAK_SAMPLE_MINUTES")
+            return self
+        
+        self._check_growth('rss_mb', soak_config.rss_limit_mb, "内存 (RSS)", "MB")
+        self._check_growth('objects', soak_config.object_limit, "Python 对象数", "个")
+        self._check_growth('tasks', 1, "asyncio 任务数", "个")
+        self._check_growth('stale_values', 1, "重复投递的订阅值（取走数超出通知数）", "条")
+        
+        self._check_drift('server_ticks_per_min', RATE_KEYS['server_ticks'][1])
+        for key in PER_TICK_KEYS:
+            self._check_drift(f'{key}_per_tick', f"{RATE_KEYS[key][1]}（每模拟周期）")
+        
+        # CPU 占用受同机其他负载影响，默认只在报告中列出
+        if soak_config.cpu_drift_limit_pct > 0:
+            self._check_drift('cpu_pct', "CPU 占用", soak_config.cpu_drift_limit_pct, increase_is_bad=True)
+        
+        late = [s['lag_p95_ms'] for s in self.samples[-len(self.samples) // 4:] if 'lag_p95_ms' in s]
+        if _mean(late) > soak_config.lag_limit_ms:
+            self.findings.append(
+                f"事件循环延迟: 末段 p95 平均 {_mean(late):.1f}ms，超过 {soak_config.lag_limit_ms:g}ms"
+            )
+        return self
+    
+    def _check_growth(self, key, limit, label, unit):
+        """按天计算增长斜率"""
+        xs = [s['hours'] / 24 for s in self.samples]
+        ys = [s[key] for s in self.samples]
+        slope = _slope(xs, ys)
+        if slope > limit and ys[-1] > ys[0]:
+            self.findings.append(
+                f"疑似泄漏 - {label}: 每虚拟天增长 {slope:.1f}{unit} ({ys[0]} -> {ys[-1]})"
+            )
+    
+    def _check_drift(self, key, label, limit=None, increase_is_bad=False):
+        """比较首尾四分之一时段的均值"""
+        limit = limit or soak_config.drift_limit_pct
+        values = [s[key] for s in self.samples if key in s]
+        quarter = len(values) // 4
+        if not quarter:
+            return
+        first = _mean(values[:quarter])
+        last = _mean(values[-quarter:])
+        if not first:
+            return
+        
+        change = (last - first) / first * 100
+        if (change > limit) if increase_is_bad else (change < -limit):
+            self.findings.append(f"吞吐漂移 - {label}: {first:.2f} -> {last:.2f} ({change:+.1f}%)")
+    
+    def log(self):
+        """输出报告"""
+        logger.info("━" * 40)
+        logger.info(f"📋 浸泡测试报告 (虚拟 {soak_config.days:g} 天, 加速 x{soak_config.speedup:g})")
+        if self.samples:
+            first, last = self.samples[0], self.samples[-1]
+            for key in ('rss_mb', 'objects', 'tasks', 'stale_values', 'cpu_pct',
+                        'notifications_per_tick', 'polls_per_tick', 'lag_p95_ms'):
+                if key in first and key in last:
+                    logger.info(f"   {key}: {first[key]} -> {last[key]}")
+        
+        if self.growth:
+            logger.info("📈 预热后增长最多的对象类型:")
+            for name, count in self.growth:
+                logger.info(f"   {name}: +{count}")
+        
+        if self.findings:
+            for finding in self.findings:
+                logger.warning(f"⚠️  {finding}")
+        else:
+            logger.info("✅ 未发现内存泄漏或吞吐漂移")
+        logger.info("━" * 40)
+    
+    def save(self, samples):
+        """写入采样数据，返回文件路径"""
+        os.makedirs(soak_config.output_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(soak_config.output_dir, f"soak-{stamp}.json")
+        
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'config': vars(soak_config),
+                'findings': self.findings,
+                'growth': self.growth,
+                'samples': samples,
+            }, f, ensure_ascii=False, indent=2)
+        logger.info(f"💾 采样数据已保存: {path}")
+        return path
+
+# ============================================================================
+# 浸泡测试
+# ============================================================================
+async def _run_client(client, mode):
+    """运行单个监控客户端"""
+    await client.connect()
+    await client.read_identification()
+    if mode == 'subscription':
+        await client.monitor_subscription()
+    else:
+        await client.monitor_polling()
+
+
+async def soak():
+    """同进程运行模拟器与客户端并采样"""
+    loop = asyncio.get_running_loop()
+    
+    # 固定随机种子，机器状态切换与生成变量每次按相同序列运行，结果可复现
+    random.seed(soak_config.seed)
+    server = litho_server.LithoMachineServer()
+    server.store.rng = np.random.default_rng(soak_config.seed)
+    await server.init()
+    
+    # 握手阶段的超时按真实时间保留（RSA 握手本身不会被加速）
+    server.admission.handshake_timeout *= soak_config.speedup
+    server.admission.queue_timeout *= soak_config.speedup
+    server_task = asyncio.create_task(server.start())
+    await asyncio.sleep(1)
+    if server_task.done():
+        # 端口被占用等：不能让客户端去测量已在监听的其他服务器
+        server_task.result()
+        raise RuntimeError("模拟器启动后立即退出")
+    
+    clients = [litho_client.LithoMonitorClient() for _ in soak_config.modes]
+    client_tasks = [
+        asyncio.create_task(_run_client(client, mode))
+        for client, mode in zip(clients, soak_config.modes)
+    ]
+    
+    sampler = SoakSampler()
+    lag_task = asyncio.create_task(sampler.probe_lag())
+    
+    logger.info(
+        f"🧪 浸泡测试: 虚拟 {soak_config.days:g} 天, 加速 x{soak_config.speedup:g}, "
+        f"预计 {soak_config.duration / soak_config.speedup / 60:.1f} 分钟, 客户端 {', '.join(soak_config.modes)}"
+    )
+    
+    runner = asyncio.create_task(sampler.run(loop))
+    try:
+        done, _ = await asyncio.wait([runner, server_task, *client_tasks], return_when=asyncio.FIRST_COMPLETED)
+        if runner not in done:
+            # 模拟器或客户端提前退出（连接失败等）
+            for task in done:
+                task.result()
+            raise RuntimeError("模拟器或客户端提前退出")
+    finally:
+        for task in [runner, lag_task, *client_tasks]:
+            task.cancel()
+        await asyncio.gather(*client_tasks, return_exceptions=True)
+        for client in clients:
+            await client.disconnect()
+        server_task.cancel()
+        await asyncio.gather(server_task, return_exceptions=True)
+    
+    report = SoakReport(sampler.samples, sampler.type_growth).analyze()
+    report.log()
+    report.save(sampler.samples)
+    return report
+
+
+def main():
+    loop = AcceleratedEventLoop(soak_config.speedup)
+    asyncio.set_event_loop(loop)
+    try:
+        report = loop.run_until_complete(soak())
+    except KeyboardInterrupt:
+        logger.info("\n🛑 浸泡测试已中止")
+        sys.exit(130)
+    except Exception as e:
+        logger.error(f"❌ 浸泡测试失败: {e}")
+        sys.exit(2)
+    finally:
+        loop.close()
+    sys.exit(1 if report.failed else 0)
+
+if __name__ == "__main__":
+    main()